@@ -0,0 +1,13 @@
+import fitz
+from typing import Dict
+
+def extract_text_from_pdf(pdf_path: str) -> tuple[Dict[int, str], int]:
+    """Extract text from PDF file on disk"""
+    with fitz.open(pdf_path, filetype="pdf") as pdf_doc:
+        num_pages = pdf_doc.page_count
+        text_by_page = {
+            page_num: page.get_text("text")
+            for page_num, page in enumerate(pdf_doc, 1)
+        }
+    
+    return text_by_page, num_pages
@@ -3,25 +3,34 @@ from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, BinaryIO
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import uuid
-from datetime import datetime, timezone
-import pypdf
-import io
+import time
+import hashlib
+import tempfile
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+import numpy as np
 import re
 from pinecone import Pinecone, ServerlessSpec
 import google.generativeai as genai
+from pdf_extraction import extract_text_from_pdf
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware so BSON datetimes come back as UTC-aware and serialize with an offset
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Initialize Pinecone
@@ -40,11 +49,40 @@ if index_name not in pc.list_indexes().names():
         )
     )
 
-index = pc.Index(index_name)
+index = pc.Index(index_name, pool_threads=30)
+
+# A "processing" reservation older than this is assumed abandoned (crash, redeploy)
+# and can be taken over by a new upload of the same file
+INGEST_RESERVATION_TIMEOUT = timedelta(minutes=30)
+
+# Bytes copied per read when spooling uploads to disk
+UPLOAD_READ_BLOCK_SIZE = 1024 * 1024
+
+# Max vectors per Pinecone upsert request
+UPSERT_BATCH_SIZE = 100
+# Max IDs per Pinecone delete request
+PINECONE_DELETE_BATCH_SIZE = 1000
 
 # Initialize Gemini
 genai.configure(api_key=os.environ['GEMINI_API_KEY'])
 
+GEMINI_GEN_MODEL = genai.GenerativeModel('gemini-2.0-flash')
+
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Max texts per Gemini embedding request
+EMBEDDING_BATCH_SIZE = 100
+# Max embedding requests in flight at once, shared across all uploads in this process
+EMBEDDING_MAX_IN_FLIGHT = 8
+embedding_semaphore = asyncio.Semaphore(EMBEDDING_MAX_IN_FLIGHT)
+
+# Worker processes for CPU-bound PDF text extraction. Spawned rather than
+# forked so workers don't inherit the Mongo/Pinecone/gRPC client threads.
+pdf_executor = ProcessPoolExecutor(
+    max_workers=os.cpu_count(),
+    mp_context=multiprocessing.get_context("spawn")
+)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -61,6 +99,7 @@ class Document(BaseModel):
     num_pages: int
     status: str = "processing"  # processing, completed, failed
     chunks_count: int = 0
+    content_hash: Optional[str] = None  # sha256 of the uploaded PDF bytes
 
 class QueryRequest(BaseModel):
     question: str
@@ -78,78 +117,257 @@ class QueryResponse(BaseModel):
     has_grounded_answer: bool
     structured_sections: Optional[Dict[str, str]] = None
 
-def extract_text_from_pdf(pdf_file: bytes) -> tuple[str, int]:
-    """Extract text from PDF file"""
-    pdf_reader = pypdf.PdfReader(io.BytesIO(pdf_file))
-    num_pages = len(pdf_reader.pages)
+class SemanticCache:
+    """In-process LRU cache of query responses, matched by exact key or embedding cosine similarity"""
+    
+    def __init__(self, max_size: int = 1000, threshold: float = 0.87, ttl_seconds: float = 24 * 60 * 60):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        # key -> (matrix row, response, created_at), in LRU order
+        self._entries: "OrderedDict[str, tuple[int, QueryResponse, float]]" = OrderedDict()
+        # Normalized embeddings, one preallocated row per slot, updated in place.
+        # Allocated on first store, once the embedding dimension is known.
+        self._matrix: Optional[np.ndarray] = None
+        self._top_ks = np.full(max_size, -1, dtype=np.int64)  # -1 marks a free row
+        self._row_keys: List[Optional[str]] = [None] * max_size
+        self._free_rows = list(range(max_size))
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return created_at < time.monotonic() - self.ttl_seconds
+    
+    def _remove(self, key: str) -> None:
+        row = self._entries.pop(key)[0]
+        self._top_ks[row] = -1
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+    
+    def get(self, key: str) -> Optional[QueryResponse]:
+        """Return the cached response stored under exactly this key"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry[2]):
+            self._remove(key)
+            return None
+        
+        self._entries.move_to_end(key)
+        return entry[1]
     
-    text_by_page = {}
-    for page_num, page in enumerate(pdf_reader.pages, 1):
-        text = page.extract_text()
-        text_by_page[page_num] = text
+    def lookup(self, embedding: List[float], top_k: int, alias_key: Optional[str] = None) -> Optional[QueryResponse]:
+        """Return a cached response for a similar question asked with the same top_k.
+        
+        On a hit, the response is also stored under alias_key (keeping the original
+        entry's age) so repeats of this exact question skip the embedding call.
+        """
+        if not self._entries:
+            return None
+        
+        similarities = self._matrix @ self._normalize(embedding)
+        similarities[self._top_ks != top_k] = -1.0
+        
+        # Walk candidates from most to least similar, expiring stale ones as they come up
+        candidates = np.flatnonzero(similarities > self.threshold)
+        for row in candidates[np.argsort(similarities[candidates])[::-1]]:
+            key = self._row_keys[row]
+            _, response, created_at = self._entries[key]
+            if self._is_expired(created_at):
+                self._remove(key)
+                continue
+            
+            self._entries.move_to_end(key)
+            if alias_key is not None and alias_key != key:
+                self.store(alias_key, embedding, top_k, response, created_at)
+            return response
+        
+        return None
     
-    return text_by_page, num_pages
+    def store(
+        self,
+        key: str,
+        embedding: List[float],
+        top_k: int,
+        response: QueryResponse,
+        created_at: Optional[float] = None
+    ) -> None:
+        """Cache a response, evicting the least recently used entry when full"""
+        if created_at is None:
+            created_at = time.monotonic()
+        vector = self._normalize(embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+        
+        if key in self._entries:
+            row = self._entries[key][0]
+        else:
+            if not self._free_rows:
+                self._remove(next(iter(self._entries)))
+            row = self._free_rows.pop()
+        
+        self._matrix[row] = vector
+        self._top_ks[row] = top_k
+        self._row_keys[row] = key
+        self._entries[key] = (row, response, created_at)
+        self._entries.move_to_end(key)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self._top_ks.fill(-1)
+        self._row_keys = [None] * self.max_size
+        self._free_rows = list(range(self.max_size))
+
+semantic_cache = SemanticCache()
+
+def exact_cache_key(question: str, top_k: int) -> str:
+    """Hash the normalized question for exact-match cache lookups"""
+    normalized = f"{top_k}:{question.strip().lower()}"
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+# Paragraph boundary: a blank line, possibly containing whitespace
+_PARA_SPLIT = re.compile(r'\n\s*\n')
 
-def semantic_chunk_text(text_by_page: Dict[int, str], chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
+def make_chunk_id(doc_id: str, page_num: int, chunk_index: int, text: str) -> str:
+    """Derive a deterministic chunk ID so re-upserting the same chunk overwrites it"""
+    key = f"{doc_id}:{page_num}:{chunk_index}:{text[:64]}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+def semantic_chunk_text(doc_id: str, text_by_page: Dict[int, str], chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
     """Chunk text semantically with overlap"""
     chunks = []
     
     for page_num, text in text_by_page.items():
         # Split by paragraphs first
-        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = _PARA_SPLIT.split(text)
         
-        current_chunk = ""
+        # Collect pieces in a list and join on flush to avoid quadratic concatenation
+        buf = []
+        buf_len = 0
         for para in paragraphs:
-            if len(current_chunk) + len(para) < chunk_size:
-                current_chunk += para + "\n\n"
+            if buf_len + len(para) < chunk_size:
+                buf.append(para)
+                buf.append("\n\n")
+                buf_len += len(para) + 2
             else:
-                if current_chunk.strip():
+                chunk_text = "".join(buf).strip()
+                if chunk_text:
                     chunks.append({
-                        "text": current_chunk.strip(),
+                        "text": chunk_text,
                         "page_number": page_num,
-                        "chunk_id": str(uuid.uuid4())
+                        "chunk_id": make_chunk_id(doc_id, page_num, len(chunks), chunk_text)
                     })
-                current_chunk = para + "\n\n"
+                buf = [para, "\n\n"]
+                buf_len = len(para) + 2
         
         # Add remaining chunk
-        if current_chunk.strip():
+        chunk_text = "".join(buf).strip()
+        if chunk_text:
             chunks.append({
-                "text": current_chunk.strip(),
+                "text": chunk_text,
                 "page_number": page_num,
-                "chunk_id": str(uuid.uuid4())
+                "chunk_id": make_chunk_id(doc_id, page_num, len(chunks), chunk_text)
             })
     
     return chunks
 
-def get_embedding(text: str) -> List[float]:
-    """Generate embedding using Gemini"""
-    result = genai.embed_content(
-        model="models/embedding-001",
-        content=text,
-        task_type="retrieval_document"
-    )
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+    """Embed one batch of texts, bounded by the process-wide semaphore"""
+    async with embedding_semaphore:
+        result = await genai.embed_content_async(
+            model=EMBEDDING_MODEL,
+            content=texts,
+            task_type="retrieval_document"
+        )
     return result['embedding']
 
-def get_query_embedding(text: str) -> List[float]:
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for many texts using concurrent batched Gemini calls"""
+    # Batch similar-length texts together to minimize padding inside the model
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    sorted_texts = [texts[i] for i in order]
+    
+    batches = await asyncio.gather(*[
+        embed_batch(sorted_texts[start:start + EMBEDDING_BATCH_SIZE])
+        for start in range(0, len(sorted_texts), EMBEDDING_BATCH_SIZE)
+    ])
+    
+    # gather preserves submission order, so scatter results back to input order
+    embeddings = [None] * len(texts)
+    sorted_embeddings = (embedding for batch in batches for embedding in batch)
+    for i, embedding in zip(order, sorted_embeddings):
+        embeddings[i] = embedding
+    return embeddings
+
+def quantize_embedding(embedding: List[float]) -> tuple[bytes, float]:
+    """Quantize an embedding to int8 bytes with a per-vector scale"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    return np.round(vector / scale).astype(np.int8).tobytes(), scale
+
+def dequantize_embedding(entry: Dict[str, Any]) -> List[float]:
+    """Rebuild a float embedding from a cache entry"""
+    # Entries written before quantization store the raw float list
+    if "v" in entry:
+        return entry["v"]
+    return (np.frombuffer(entry["q"], dtype=np.int8).astype(np.float32) * entry["scale"]).tolist()
+
+async def get_or_compute_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embeddings from the MongoDB cache, computing only unseen texts"""
+    hashes = [hashlib.sha256(f"{EMBEDDING_MODEL}:{text}".encode()).hexdigest() for text in texts]
+    
+    cached = await db.embedding_cache.find({"_id": {"$in": list(set(hashes))}}).to_list(None)
+    embeddings_by_hash = {entry["_id"]: dequantize_embedding(entry) for entry in cached}
+    
+    # Embed each missing text once, even if it repeats within the upload
+    missing = {h: text for h, text in zip(hashes, texts) if h not in embeddings_by_hash}
+    if missing:
+        new_embeddings = await get_embeddings(list(missing.values()))
+        new_entries = []
+        for h, embedding in zip(missing, new_embeddings):
+            quantized, scale = quantize_embedding(embedding)
+            new_entries.append({"_id": h, "model": EMBEDDING_MODEL, "q": quantized, "scale": scale})
+        try:
+            await db.embedding_cache.insert_many(new_entries, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean a concurrent upload cached the same text first
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        embeddings_by_hash.update(zip(missing, new_embeddings))
+    
+    return [embeddings_by_hash[h] for h in hashes]
+
+async def get_query_embedding(text: str) -> List[float]:
     """Generate embedding for query using Gemini"""
-    result = genai.embed_content(
-        model="models/embedding-001",
+    result = await genai.embed_content_async(
+        model=EMBEDDING_MODEL,
         content=text,
         task_type="retrieval_query"
     )
     return result['embedding']
 
-async def generate_answer(question: str, context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Generate answer using Gemini with safety prompts"""
+def upsert_vectors(vectors: List[Dict[str, Any]]) -> None:
+    """Upsert vectors to Pinecone in parallel batches"""
+    async_results = [
+        index.upsert(vectors=vectors[start:start + UPSERT_BATCH_SIZE], async_req=True)
+        for start in range(0, len(vectors), UPSERT_BATCH_SIZE)
+    ]
     
-    # Build context from retrieved chunks
-    context = "\n\n".join([
-        f"[Page {chunk['page_number']}, Chunk ID: {chunk['chunk_id']}]\n{chunk['text']}"
-        for chunk in context_chunks
-    ])
-    
-    # Safety and grounding prompt
-    prompt = f"""You are a health insurance policy assistant. Your task is to answer questions based ONLY on the provided policy document excerpts.
+    # Wait for all batches to complete
+    for async_result in async_results:
+        async_result.get()
+
+def delete_vectors(ids: List[str]) -> None:
+    """Delete vectors from Pinecone by ID in batches"""
+    for start in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+        index.delete(ids=ids[start:start + PINECONE_DELETE_BATCH_SIZE])
+
+# Safety and grounding prompt
+_PROMPT_TMPL = """You are a health insurance policy assistant. Your task is to answer questions based ONLY on the provided policy document excerpts.
 
 IMPORTANT INSTRUCTIONS:
 1. Answer ONLY based on the information in the context below
@@ -164,81 +382,219 @@ CONTEXT FROM POLICY DOCUMENTS:
 QUESTION: {question}
 
 ANSWER (with citations):"""
+
+# Marker phrase the prompt asks the model to use when the context lacks an answer
+_UNGROUNDED_RE = re.compile(r"does not contain information", re.IGNORECASE)
+
+async def generate_answer(question: str, context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Generate answer using Gemini with safety prompts"""
     
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(prompt)
+    # Build context from retrieved chunks
+    context = "\n\n".join([
+        f"[Page {chunk['page_number']}, Chunk ID: {chunk['chunk_id']}]\n{chunk['text']}"
+        for chunk in context_chunks
+    ])
+    
+    prompt = _PROMPT_TMPL.format(context=context, question=question)
+    
+    response = await GEMINI_GEN_MODEL.generate_content_async(prompt)
     
     # Check if answer is grounded
-    has_grounded_answer = "does not contain information" not in response.text.lower()
+    has_grounded_answer = _UNGROUNDED_RE.search(response.text) is None
     
     return {
         "answer": response.text,
         "has_grounded_answer": has_grounded_answer
     }
 
+def spool_upload_to_disk(upload: BinaryIO) -> tuple[str, str]:
+    """Copy an upload to a temp file in blocks, returning its path and sha256"""
+    content_hash = hashlib.sha256()
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        try:
+            while block := upload.read(UPLOAD_READ_BLOCK_SIZE):
+                content_hash.update(block)
+                tmp.write(block)
+        except BaseException:
+            # The caller never receives the path, so clean up here
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name, content_hash.hexdigest()
+
+async def reserve_document(doc: Document) -> Optional[Document]:
+    """Reserve doc's content hash for ingestion.
+    
+    Returns None if this caller should ingest the file, or the existing record if
+    it was already ingested. Raises if another upload is still ingesting it.
+    """
+    try:
+        await db.documents.insert_one(doc.model_dump())
+        return None
+    except DuplicateKeyError:
+        pass
+    
+    # Take over a reservation whose ingest was abandoned without cleaning up
+    cutoff = datetime.now(timezone.utc) - INGEST_RESERVATION_TIMEOUT
+    stale = await db.documents.find_one_and_update(
+        {"content_hash": doc.content_hash, "status": {"$ne": "completed"}, "upload_date": {"$lt": cutoff}},
+        {"$set": {"filename": doc.filename, "upload_date": doc.upload_date}}
+    )
+    if stale is not None:
+        # Chunk IDs are deterministic, so rows from the abandoned attempt would collide
+        await db.chunks.delete_many({"doc_id": doc.id})
+        return None
+    
+    existing = await db.documents.find_one({"content_hash": doc.content_hash}, {"_id": 0})
+    if existing is None:
+        raise RuntimeError("A concurrent upload of this file failed, please retry")
+    if existing["status"] != "completed":
+        raise RuntimeError("This file is already being processed, please retry later")
+    return Document(**existing)
+
+async def process_document(filename: str, pdf_path: str, content_hash: str) -> Document:
+    """Extract, chunk, embed and index a single spooled PDF"""
+    # Reserve the content hash so concurrent uploads of the same file ingest it only once
+    doc = Document(
+        # Derived from the content so a re-upload reproduces the same chunk IDs
+        id=str(uuid.UUID(content_hash[:32])),
+        filename=filename,
+        num_pages=0,
+        status="processing",
+        content_hash=content_hash
+    )
+    existing = await reserve_document(doc)
+    if existing is not None:
+        return existing
+    
+    completed = False
+    chunks = []
+    try:
+        # Extract text in a worker process so files are parsed on separate cores
+        loop = asyncio.get_running_loop()
+        text_by_page, num_pages = await loop.run_in_executor(pdf_executor, extract_text_from_pdf, pdf_path)
+        
+        # Chunk text
+        chunks = semantic_chunk_text(doc.id, text_by_page)
+        
+        # Store full chunk text in MongoDB; Pinecone metadata stays small.
+        # Written before the upsert so every queryable vector has its text
+        if chunks:
+            await db.chunks.insert_many([
+                {
+                    "_id": chunk["chunk_id"],
+                    "text": chunk["text"],
+                    "page": chunk["page_number"],
+                    "doc_id": doc.id
+                }
+                for chunk in chunks
+            ])
+        
+        # Generate embeddings and store in Pinecone
+        embeddings = await get_or_compute_embeddings([chunk["text"] for chunk in chunks])
+        vectors_to_upsert = []
+        for chunk, embedding in zip(chunks, embeddings):
+            vectors_to_upsert.append({
+                "id": chunk["chunk_id"],
+                "values": embedding,
+                "metadata": {
+                    "document_id": doc.id,
+                    "filename": filename,
+                    "page_number": chunk["page_number"]
+                }
+            })
+        
+        # Batch upsert to Pinecone
+        if vectors_to_upsert:
+            await asyncio.to_thread(upsert_vectors, vectors_to_upsert)
+        
+        # Update document status
+        doc.num_pages = num_pages
+        doc.status = "completed"
+        doc.chunks_count = len(chunks)
+        
+        # Save to MongoDB
+        await db.documents.update_one(
+            {"id": doc.id},
+            {"$set": {"num_pages": doc.num_pages, "status": doc.status, "chunks_count": doc.chunks_count}}
+        )
+        completed = True
+    finally:
+        # Also runs on cancellation, which is not an Exception
+        if not completed:
+            # Drop partial vectors and rows and release the reservation so the
+            # file can be uploaded again
+            if chunks:
+                await asyncio.to_thread(delete_vectors, [chunk["chunk_id"] for chunk in chunks])
+            await db.chunks.delete_many({"doc_id": doc.id})
+            await db.documents.delete_one({"id": doc.id})
+    
+    return doc
+
 @api_router.post("/upload")
 async def upload_documents(files: List[UploadFile] = File(...)):
     """Upload and process PDF documents"""
     try:
-        processed_docs = []
+        pdf_files = [file for file in files if file.filename.endswith('.pdf')]
         
-        for file in files:
-            if not file.filename.endswith('.pdf'):
-                continue
-            
-            # Read PDF
-            pdf_content = await file.read()
+        # Stream each PDF to disk rather than holding whole files in memory
+        spooled = await asyncio.gather(
+            *[asyncio.to_thread(spool_upload_to_disk, file.file) for file in pdf_files],
+            return_exceptions=True
+        )
+        
+        try:
+            processed_docs = []
+            failed_files = []
             
-            # Extract text
-            text_by_page, num_pages = extract_text_from_pdf(pdf_content)
+            # Ingest each distinct file once, even if it appears twice in this upload
+            files_by_hash = {}
+            for file, result in zip(pdf_files, spooled):
+                if isinstance(result, Exception):
+                    logging.error(f"Error reading {file.filename}: {str(result)}")
+                    failed_files.append({"filename": file.filename, "error": str(result)})
+                    continue
+                pdf_path, content_hash = result
+                files_by_hash.setdefault(content_hash, (file.filename, pdf_path))
             
-            # Create document record
-            doc_id = str(uuid.uuid4())
-            doc = Document(
-                id=doc_id,
-                filename=file.filename,
-                num_pages=num_pages,
-                status="processing"
+            # Process all PDFs concurrently; wait for every file so none keeps
+            # ingesting in the background after the response is sent
+            results = await asyncio.gather(
+                *[
+                    process_document(filename, pdf_path, content_hash)
+                    for content_hash, (filename, pdf_path) in files_by_hash.items()
+                ],
+                return_exceptions=True
             )
             
-            # Chunk text
-            chunks = semantic_chunk_text(text_by_page)
-            
-            # Generate embeddings and store in Pinecone
-            vectors_to_upsert = []
-            for chunk in chunks:
-                embedding = get_embedding(chunk["text"])
-                vectors_to_upsert.append({
-                    "id": chunk["chunk_id"],
-                    "values": embedding,
-                    "metadata": {
-                        "document_id": doc_id,
-                        "filename": file.filename,
-                        "page_number": chunk["page_number"],
-                        "text": chunk["text"][:1000]  # Store first 1000 chars in metadata
-                    }
-                })
-            
-            # Batch upsert to Pinecone
-            if vectors_to_upsert:
-                index.upsert(vectors=vectors_to_upsert)
-            
-            # Update document status
-            doc.status = "completed"
-            doc.chunks_count = len(chunks)
-            
-            # Save to MongoDB
-            doc_dict = doc.model_dump()
-            doc_dict['upload_date'] = doc_dict['upload_date'].isoformat()
-            await db.documents.insert_one(doc_dict)
-            
-            processed_docs.append(doc)
+            for (filename, _), result in zip(files_by_hash.values(), results):
+                if isinstance(result, Exception):
+                    logging.error(f"Error processing {filename}: {str(result)}")
+                    failed_files.append({"filename": filename, "error": str(result)})
+                else:
+                    processed_docs.append(result)
+        finally:
+            for result in spooled:
+                if not isinstance(result, Exception):
+                    os.remove(result[0])
+        
+        # New documents can change answers, so drop cached responses
+        if processed_docs:
+            semantic_cache.clear()
+        
+        if failed_files and not processed_docs:
+            raise HTTPException(status_code=500, detail=failed_files[0]["error"])
         
         return {
             "message": f"Successfully processed {len(processed_docs)} documents",
-            "documents": [doc.model_dump() for doc in processed_docs]
+            "documents": [doc.model_dump() for doc in processed_docs],
+            "failed": failed_files
         }
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         logging.error(f"Error processing documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -247,8 +603,19 @@ async def upload_documents(files: List[UploadFile] = File(...)):
 async def query_documents(query: QueryRequest):
     """Query the RAG system"""
     try:
+        # Serve repeated questions before any model call
+        cache_key = exact_cache_key(query.question, query.top_k)
+        cached_response = semantic_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+        
         # Generate query embedding
-        query_embedding = get_query_embedding(query.question)
+        query_embedding = await get_query_embedding(query.question)
+        
+        # Serve paraphrases of recently answered questions from cache
+        cached_response = semantic_cache.lookup(query_embedding, query.top_k, alias_key=cache_key)
+        if cached_response is not None:
+            return cached_response
         
         # Search in Pinecone
         search_results = index.query(
@@ -261,9 +628,19 @@ async def query_documents(query: QueryRequest):
         context_chunks = []
         citations = []
         
-        for match in search_results['matches']:
+        # Fetch full chunk text from MongoDB
+        matches = search_results['matches']
+        stored_chunks = await db.chunks.find({"_id": {"$in": [match['id'] for match in matches]}}).to_list(None)
+        text_by_chunk_id = {chunk["_id"]: chunk["text"] for chunk in stored_chunks}
+        
+        for match in matches:
+            # Vectors indexed before chunks moved to MongoDB carry their text in metadata
+            text = text_by_chunk_id.get(match['id']) or match['metadata'].get('text')
+            if not text:
+                # Vector left over from an interrupted ingest; nothing to ground on
+                continue
             chunk_data = {
-                "text": match['metadata']['text'],
+                "text": text,
                 "page_number": match['metadata']['page_number'],
                 "chunk_id": match['id']
             }
@@ -272,18 +649,21 @@ async def query_documents(query: QueryRequest):
             citations.append(Citation(
                 page_number=match['metadata']['page_number'],
                 chunk_id=match['id'],
-                text_snippet=match['metadata']['text'][:200] + "...",
+                text_snippet=text[:200] + "...",
                 relevance_score=match['score']
             ))
         
         # Generate answer using Gemini
         answer_data = await generate_answer(query.question, context_chunks)
         
-        return QueryResponse(
+        response = QueryResponse(
             answer=answer_data["answer"],
             citations=citations,
             has_grounded_answer=answer_data["has_grounded_answer"]
         )
+        semantic_cache.store(cache_key, query_embedding, query.top_k, response)
+        
+        return response
     
     except Exception as e:
         logging.error(f"Error querying documents: {str(e)}")
@@ -292,13 +672,17 @@ async def query_documents(query: QueryRequest):
 @api_router.get("/documents", response_model=List[Document])
 async def get_documents():
     """Get all uploaded documents"""
-    documents = await db.documents.find({}, {"_id": 0}).to_list(1000)
-    
-    # Convert ISO string timestamps back to datetime objects
-    for doc in documents:
-        if isinstance(doc['upload_date'], str):
-            doc['upload_date'] = datetime.fromisoformat(doc['upload_date'])
-    
+    # Project only the fields the document list renders
+    projection = {
+        "_id": 0,
+        "id": 1,
+        "filename": 1,
+        "upload_date": 1,
+        "num_pages": 1,
+        "status": 1,
+        "chunks_count": 1
+    }
+    documents = await db.documents.find({}, projection).sort("upload_date", -1).to_list(length=None)
     return documents
 
 @api_router.delete("/documents")
@@ -310,6 +694,8 @@ async def delete_all_documents():
         
         # Delete from MongoDB
         result = await db.documents.delete_many({})
+        await db.chunks.delete_many({})
+        semantic_cache.clear()
         
         return {
             "message": f"Deleted {result.deleted_count} documents from database and cleared vector store"
@@ -340,6 +726,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    await db.documents.create_index("id", unique=True)
+    await db.documents.create_index("upload_date")
+    # Unique so an in-flight "processing" record reserves its file; partial so
+    # documents indexed before content hashing (no hash) don't collide
+    await db.documents.create_index(
+        "content_hash",
+        unique=True,
+        partialFilterExpression={"content_hash": {"$type": "string"}}
+    )
+    await db.chunks.create_index("doc_id")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    pdf_executor.shutdown()
\ No newline at end of file
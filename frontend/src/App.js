@@ -79,16 +79,25 @@ function App() {
       clearInterval(progressInterval);
       setUploadProgress(100);
 
-      toast.success(`Successfully uploaded ${response.data.documents.length} document(s)`);
+      const failed = response.data.failed || [];
+      if (response.data.documents.length > 0) {
+        toast.success(`Successfully uploaded ${response.data.documents.length} document(s)`);
+      }
+      if (failed.length > 0) {
+        toast.error(`Failed to process ${failed.map(f => f.filename).join(", ")}`);
+      }
       setSelectedFiles([]);
       if (fileInputRef.current) {
         fileInputRef.current.value = '';
       }
       fetchDocuments();
       
-      setTimeout(() => {
-        setActiveTab("chat");
-      }, 1000);
+      // Stay on the upload tab so failed files can be retried
+      if (failed.length === 0) {
+        setTimeout(() => {
+          setActiveTab("chat");
+        }, 1000);
+      }
     } catch (error) {
       console.error("Error uploading documents:", error);
       toast.error("Failed to upload documents");